@@ -0,0 +1,73 @@
+"""Run CLI queries through the query server or a local read connection.
+
+socket is only imported when LIBRARY_DOCS_SOCKET is set, so the default
+path costs no more than opening the database directly.
+"""
+import json
+import os
+from contextlib import contextmanager
+from db import (
+    get_connection,
+    get_document,
+    library_exists,
+    list_documents,
+    list_libraries,
+    search_documents,
+)
+
+SOCKET_ENV = 'LIBRARY_DOCS_SOCKET'
+
+# Fall back to a local connection when the server doesn't answer within this (seconds)
+REQUEST_TIMEOUT = 5.0
+
+COMMANDS = {
+    'search': search_documents,
+    'list_libraries': list_libraries,
+    'list_documents': list_documents,
+    'get_document': get_document,
+    'library_exists': library_exists,
+}
+
+
+def request(socket_path: str, cmd: str, *args):
+    """Send one command to the server and return its result."""
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(REQUEST_TIMEOUT)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps({"cmd": cmd, "args": args}).encode() + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('rb') as f:
+            response = json.loads(f.readline())
+    if 'error' in response:
+        raise RuntimeError(f"library-docs server: {response['error']}")
+    return response['result']
+
+
+@contextmanager
+def open_client():
+    """Yield call(cmd, *args), answered by the server when LIBRARY_DOCS_SOCKET
+    names a listening socket and by a local read connection otherwise."""
+    socket_path = os.environ.get(SOCKET_ENV)
+    if socket_path:
+        socket_path = os.path.expanduser(socket_path)
+    conn = None
+
+    def call(cmd: str, *args):
+        nonlocal socket_path, conn
+        if socket_path:
+            try:
+                return request(socket_path, cmd, *args)
+            except (OSError, ValueError):
+                # No usable server (stale socket, timeout, truncated reply)
+                socket_path = None
+        if conn is None:
+            conn = get_connection(writer=False)
+        return COMMANDS[cmd](conn, *args)
+
+    try:
+        yield call
+    finally:
+        if conn is not None:
+            conn.close()
@@ -1,4 +1,5 @@
 """SQLite utilities for library documentation indexer."""
+import functools
 import re
 import sqlite3
 from pathlib import Path
@@ -6,19 +7,193 @@ from typing import Optional
 
 DB_PATH = Path(__file__).parent.parent / "data" / "library.db"
 
+# Connection tuning shared by indexers and readers
+PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",  # 64 MiB
+    "PRAGMA mmap_size=268435456",  # 256 MiB
+    "PRAGMA busy_timeout=5000",
+)
+
+# Extra tuning for writers; WAL mode persists in the database file, so
+# readers don't need to (re)set it
+WRITER_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA wal_autocheckpoint=10000",  # fewer checkpoints during batch ingest
+)
+
+# Stored in PRAGMA user_version; bump when the schema below changes
+SCHEMA_VERSION = 3
+
+# FTS5 tokenizer and default ranking (title, content, path weights).
+# Every query term is a prefix query, but no prefix= indexes are declared:
+# bm25 top-K ranking dominates search time, while prefix='2 3 4' made index
+# builds ~4x slower and the index ~3x larger.
+FTS_TOKENIZE = "porter unicode61 remove_diacritics 2"
+FTS_RANK = "bm25(10.0, 1.0, 5.0)"
+
+# Whitespace-separated search terms
+_FTS_TERM_RE = re.compile(r'\S+')
+
+# FTS5 special characters escaped in user queries (everything except *)
+_FTS_ESCAPE_RE = re.compile(r'(["\^\$\(\)\[\]\{\}\|\+])')
+
+# Triggers keeping documents_fts in sync with documents
+_FTS_TRIGGERS = {
+    "documents_ai": """
+        CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+            INSERT INTO documents_fts(rowid, title, content, path)
+            VALUES (new.id, new.title, new.content, new.path);
+        END
+    """,
+    "documents_ad": """
+        CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
+            INSERT INTO documents_fts(documents_fts, rowid, title, content, path)
+            VALUES('delete', old.id, old.title, old.content, old.path);
+        END
+    """,
+    "documents_au": """
+        CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN
+            INSERT INTO documents_fts(documents_fts, rowid, title, content, path)
+            VALUES('delete', old.id, old.title, old.content, old.path);
+            INSERT INTO documents_fts(rowid, title, content, path)
+            VALUES (new.id, new.title, new.content, new.path);
+        END
+    """,
+}
+
+# Prepared statement cache size per connection
+CACHED_STATEMENTS = 256
+
+# Hot-path SQL kept as module constants so the statement cache always hits
+_INSERT_LIBRARY_SQL = "INSERT OR IGNORE INTO libraries (name) VALUES (?)"
+
+_SELECT_LIBRARY_ID_SQL = "SELECT id FROM libraries WHERE name = ?"
+
+# Rows per multi-row upsert statement; SQLite allowed only 999 bound
+# variables (5 per row) before 3.32
+UPSERT_ROWS_PER_STATEMENT = 1000 if sqlite3.sqlite_version_info >= (3, 32, 0) else 199
+
+_DOCUMENT_ROW = "(?, ?, ?, ?, ?)"
+
+# Only rewrites (and re-tokenizes) rows whose content actually changed
+_UPSERT_DOCUMENTS_SQL = """
+    INSERT INTO documents (library_id, path, content, title, url)
+    VALUES {values}
+    ON CONFLICT(library_id, path) DO UPDATE SET
+        content = excluded.content,
+        title = excluded.title,
+        url = excluded.url,
+        indexed_at = CURRENT_TIMESTAMP
+    WHERE documents.content <> excluded.content
+        OR IFNULL(documents.title, '') <> IFNULL(excluded.title, '')
+        OR IFNULL(documents.url, '') <> IFNULL(excluded.url, '')
+"""
+
+_UPSERT_DOCUMENT_SQL = _UPSERT_DOCUMENTS_SQL.format(values=_DOCUMENT_ROW)
+
+_UPDATE_LIBRARY_STATS_SQL = """
+    UPDATE libraries
+    SET doc_count = (SELECT COUNT(*) FROM documents WHERE library_id = ?),
+        indexed_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+"""
+
+_UPSERT_FILE_SQL = """
+    INSERT INTO files (library_id, path, mtime_ns, size, options)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(library_id, path) DO UPDATE SET
+        mtime_ns = excluded.mtime_ns,
+        size = excluded.size,
+        options = excluded.options
+"""
+
+_TOUCH_LIBRARY_SQL = "UPDATE libraries SET indexed_at = CURRENT_TIMESTAMP WHERE id = ?"
+
+# documents_fts consumes ORDER BY rank itself, so snippets are only built for
+# the returned rows. The join is needed for url and library_id, which the FTS
+# table does not carry; library_id already leads the UNIQUE(library_id, path)
+# index, so no separate index is needed for the library filter.
+_SEARCH_SQL = """
+    SELECT
+        d.id,
+        d.path,
+        d.title,
+        d.url,
+        snippet(documents_fts, 1, '>>>', '<<<', '...', 64) as snippet,
+        l.name as library
+    FROM documents_fts
+    JOIN documents d ON documents_fts.rowid = d.id
+    JOIN libraries l ON d.library_id = l.id
+    WHERE documents_fts MATCH ?
+"""
+
+_SEARCH_ALL_SQL = _SEARCH_SQL + " ORDER BY rank LIMIT ?"
+
+_SEARCH_LIBRARY_SQL = _SEARCH_SQL + " AND l.name = ? ORDER BY rank LIMIT ?"
+
+# Matches by id, then path, then title; each branch is an index seek
+# (the title branch uses idx_documents_title_nocase)
+_GET_DOCUMENT_SQL = """
+    SELECT id, path, title, url, content FROM (
+        SELECT 0 AS priority, id, path, title, url, content
+        FROM documents
+        WHERE library_id = :library_id AND id = :maybe_id
+        UNION ALL
+        SELECT 1, id, path, title, url, content
+        FROM documents
+        WHERE library_id = :library_id AND path = :ident
+        UNION ALL
+        SELECT 2, id, path, title, url, content
+        FROM documents
+        WHERE library_id = :library_id AND title = :ident COLLATE NOCASE
+    )
+    ORDER BY priority
+    LIMIT 1
+"""
+
 
-def get_connection() -> sqlite3.Connection:
-    """Get a database connection, creating tables if needed."""
+def get_connection(writer: bool = True) -> sqlite3.Connection:
+    """Get a database connection, creating tables if needed.
+
+    Pass writer=False from read-only commands to skip writer-only PRAGMAs.
+    """
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH))
+    conn = sqlite3.connect(str(DB_PATH), cached_statements=CACHED_STATEMENTS)
     conn.row_factory = sqlite3.Row
+    apply_pragmas(conn, writer)
     init_db(conn)
     return conn
 
 
+def apply_pragmas(conn: sqlite3.Connection, writer: bool = True) -> None:
+    """Apply cache tuning, plus WAL journaling for writers, to a connection."""
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    if writer:
+        for pragma in WRITER_PRAGMAS:
+            conn.execute(pragma)
+
+
 def init_db(conn: sqlite3.Connection) -> None:
-    """Initialize database schema with FTS5."""
-    conn.executescript("""
+    """Initialize database schema with FTS5.
+
+    Skipped when PRAGMA user_version already matches SCHEMA_VERSION.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version == SCHEMA_VERSION:
+        return
+
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'documents_fts'"
+    ).fetchone()
+    rebuild_fts = row is None or FTS_TOKENIZE not in row["sql"]
+    if row is not None and rebuild_fts:
+        # Older schema: recreate the FTS index with the current options
+        conn.execute("DROP TABLE documents_fts")
+
+    conn.executescript(f"""
         CREATE TABLE IF NOT EXISTS libraries (
             id INTEGER PRIMARY KEY,
             name TEXT UNIQUE NOT NULL,
@@ -38,46 +213,103 @@ def init_db(conn: sqlite3.Connection) -> None:
             UNIQUE(library_id, path)
         );
 
+        -- Source files seen by batch indexing, used to skip unchanged files
+        CREATE TABLE IF NOT EXISTS files (
+            library_id INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            options TEXT NOT NULL,
+            PRIMARY KEY (library_id, path),
+            FOREIGN KEY (library_id) REFERENCES libraries(id)
+        );
+
         CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
             title,
             content,
             path,
             content='documents',
-            content_rowid='id'
+            content_rowid='id',
+            tokenize='{FTS_TOKENIZE}'
         );
 
-        CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
-            INSERT INTO documents_fts(rowid, title, content, path)
-            VALUES (new.id, new.title, new.content, new.path);
-        END;
+        CREATE INDEX IF NOT EXISTS idx_documents_title_nocase
+            ON documents(library_id, title COLLATE NOCASE);
 
-        CREATE TRIGGER IF NOT EXISTS documents_ad AFTER DELETE ON documents BEGIN
-            INSERT INTO documents_fts(documents_fts, rowid, title, content, path)
-            VALUES('delete', old.id, old.title, old.content, old.path);
+        -- Covers list_documents without touching the (large) document rows
+        CREATE INDEX IF NOT EXISTS idx_documents_list
+            ON documents(library_id, path, title, url);
+
+        CREATE TRIGGER IF NOT EXISTS documents_count_ai AFTER INSERT ON documents BEGIN
+            UPDATE libraries SET doc_count = doc_count + 1 WHERE id = new.library_id;
         END;
 
-        CREATE TRIGGER IF NOT EXISTS documents_au AFTER UPDATE ON documents BEGIN
-            INSERT INTO documents_fts(documents_fts, rowid, title, content, path)
-            VALUES('delete', old.id, old.title, old.content, old.path);
-            INSERT INTO documents_fts(rowid, title, content, path)
-            VALUES (new.id, new.title, new.content, new.path);
+        CREATE TRIGGER IF NOT EXISTS documents_count_ad AFTER DELETE ON documents BEGIN
+            UPDATE libraries SET doc_count = doc_count - 1 WHERE id = old.library_id;
         END;
     """)
+    create_fts_triggers(conn)
+
+    if rebuild_fts:
+        # Persist the ranking so queries can ORDER BY rank
+        conn.execute(
+            "INSERT INTO documents_fts(documents_fts, rank) VALUES ('rank', ?)",
+            (FTS_RANK,)
+        )
+        conn.execute("INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     conn.commit()
 
 
+def create_fts_triggers(conn: sqlite3.Connection) -> None:
+    """Create the triggers that keep documents_fts in sync (no commit)."""
+    for sql in _FTS_TRIGGERS.values():
+        conn.execute(sql)
+
+
+def drop_fts_triggers(conn: sqlite3.Connection) -> None:
+    """Drop the FTS sync triggers ahead of a bulk load (no commit).
+
+    The index is stale until rebuild_fts_index() runs, so do both in the
+    same transaction.
+    """
+    for name in _FTS_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+
+def rebuild_fts_index(conn: sqlite3.Connection) -> None:
+    """Rebuild documents_fts in one pass and restore its triggers (no commit).
+
+    The rebuilt index is then merged into a single b-tree for later queries.
+    """
+    conn.execute("INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')")
+    conn.execute("INSERT INTO documents_fts(documents_fts) VALUES ('optimize')")
+    create_fts_triggers(conn)
+
+
+def optimize_db(conn: sqlite3.Connection) -> None:
+    """Refresh query planner statistics after a bulk load."""
+    has_stats = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+    ).fetchone()
+    if not has_stats:
+        # First load: seed sqlite_stat1 so PRAGMA optimize has a baseline
+        conn.execute("ANALYZE documents")
+        conn.execute("ANALYZE libraries")
+    conn.execute("PRAGMA optimize")
+
+
 def get_or_create_library(conn: sqlite3.Connection, name: str) -> int:
     """Get or create a library entry, returning its ID."""
-    cursor = conn.execute(
-        "INSERT OR IGNORE INTO libraries (name) VALUES (?)",
-        (name,)
-    )
+    # Existing libraries need no write transaction
+    row = conn.execute(_SELECT_LIBRARY_ID_SQL, (name,)).fetchone()
+    if row:
+        return row["id"]
+
+    conn.execute(_INSERT_LIBRARY_SQL, (name,))
     conn.commit()
 
-    row = conn.execute(
-        "SELECT id FROM libraries WHERE name = ?",
-        (name,)
-    ).fetchone()
+    row = conn.execute(_SELECT_LIBRARY_ID_SQL, (name,)).fetchone()
     return row["id"]
 
 
@@ -90,26 +322,70 @@ def upsert_document(
     url: str = None
 ) -> None:
     """Insert or update a document."""
-    # Delete existing to trigger FTS update
+    upsert_document_no_commit(conn, library_id, path, content, title, url)
+    conn.execute(_TOUCH_LIBRARY_SQL, (library_id,))
+    conn.commit()
+
+
+def upsert_document_no_commit(
+    conn: sqlite3.Connection,
+    library_id: int,
+    path: str,
+    content: str,
+    title: str = None,
+    url: str = None
+) -> None:
+    """Insert or update a document without committing."""
+    # FTS is kept in sync by the insert/update triggers; doc_count by
+    # the documents_count_* triggers
     conn.execute(
-        "DELETE FROM documents WHERE library_id = ? AND path = ?",
-        (library_id, path)
+        _UPSERT_DOCUMENT_SQL,
+        (library_id, path, content, title, url)
     )
 
-    conn.execute("""
-        INSERT INTO documents (library_id, path, content, title, url)
-        VALUES (?, ?, ?, ?, ?)
-    """, (library_id, path, content, title, url))
 
-    # Update doc count
-    conn.execute("""
-        UPDATE libraries
-        SET doc_count = (SELECT COUNT(*) FROM documents WHERE library_id = ?),
-            indexed_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    """, (library_id, library_id))
+@functools.lru_cache(maxsize=None)
+def _upsert_many_sql(row_count: int) -> str:
+    """Build (once per row count) a multi-row upsert statement."""
+    return _UPSERT_DOCUMENTS_SQL.format(values=", ".join([_DOCUMENT_ROW] * row_count))
 
-    conn.commit()
+
+def upsert_documents_many(conn: sqlite3.Connection, rows: list) -> None:
+    """Insert or update many documents without committing.
+
+    Each row is a (library_id, path, content, title, url) tuple. Rows are
+    sent as multi-row INSERT statements, which lets the FTS triggers work
+    through a whole statement at a time and is several times faster than
+    executemany over single-row inserts.
+    """
+    for start in range(0, len(rows), UPSERT_ROWS_PER_STATEMENT):
+        batch = rows[start:start + UPSERT_ROWS_PER_STATEMENT]
+        params = [value for row in batch for value in row]
+        conn.execute(_upsert_many_sql(len(batch)), params)
+
+
+def get_file_stats(conn: sqlite3.Connection, library_id: int) -> dict:
+    """Map each indexed source file path to its (mtime_ns, size, options)."""
+    return {
+        row["path"]: (row["mtime_ns"], row["size"], row["options"])
+        for row in conn.execute(
+            "SELECT path, mtime_ns, size, options FROM files WHERE library_id = ?",
+            (library_id,)
+        )
+    }
+
+
+def record_file_stats(conn: sqlite3.Connection, rows: list) -> None:
+    """Store source file stats without committing.
+
+    Each row is a (library_id, path, mtime_ns, size, options) tuple.
+    """
+    conn.executemany(_UPSERT_FILE_SQL, rows)
+
+
+def update_library_stats(conn: sqlite3.Connection, library_id: int) -> None:
+    """Recompute a library's doc count and indexed timestamp (no commit)."""
+    conn.execute(_UPDATE_LIBRARY_STATS_SQL, (library_id, library_id))
 
 
 def build_fts_query(query: str) -> str:
@@ -119,27 +395,23 @@ def build_fts_query(query: str) -> str:
     - Words ending with * are treated as prefix searches
     - Title matches are boosted with higher weight
     """
-    # Split on whitespace, filter empty
-    terms = [t.strip() for t in query.split() if t.strip()]
-
-    if not terms:
-        return '""'
-
     fts_terms = []
-    for term in terms:
+    for term in _FTS_TERM_RE.findall(query):
         # Escape special FTS5 characters except *
-        escaped = re.sub(r'(["\^\$\(\)\[\]\{\}\|\+])', r'\\\1', term)
+        escaped = _FTS_ESCAPE_RE.sub(r'\\\1', term)
 
         if escaped.endswith('*'):
             # Prefix search
-            fts_terms.append(f'{escaped}')
+            fts_terms.append(escaped)
         else:
             # Exact term with prefix matching for better recall
             fts_terms.append(f'"{escaped}"*')
 
+    if not fts_terms:
+        return '""'
+
     # Combine terms with OR, boost title matches
-    term_query = ' OR '.join(fts_terms)
-    return f'({term_query})'
+    return '(' + ' OR '.join(fts_terms) + ')'
 
 
 def search_documents(
@@ -156,30 +428,12 @@ def search_documents(
     """
     fts_query = build_fts_query(query)
 
-    sql = """
-        SELECT
-            d.id,
-            d.path,
-            d.title,
-            d.url,
-            snippet(documents_fts, 1, '>>>', '<<<', '...', 64) as snippet,
-            l.name as library,
-            bm25(documents_fts, 10.0, 1.0, 5.0) as rank
-        FROM documents_fts fts
-        JOIN documents d ON fts.rowid = d.id
-        JOIN libraries l ON d.library_id = l.id
-        WHERE documents_fts MATCH ?
-    """
-    params = [fts_query]
-
     if library_name:
-        sql += " AND l.name = ?"
-        params.append(library_name)
-
-    sql += " ORDER BY rank LIMIT ?"
-    params.append(limit)
+        return conn.execute(
+            _SEARCH_LIBRARY_SQL, (fts_query, library_name, limit)
+        ).fetchall()
 
-    return conn.execute(sql, params).fetchall()
+    return conn.execute(_SEARCH_ALL_SQL, (fts_query, limit)).fetchall()
 
 
 def list_libraries(conn: sqlite3.Connection) -> list:
@@ -191,6 +445,11 @@ def list_libraries(conn: sqlite3.Connection) -> list:
     """).fetchall()
 
 
+def library_exists(conn: sqlite3.Connection, name: str) -> bool:
+    """Check whether a library is indexed."""
+    return conn.execute(_SELECT_LIBRARY_ID_SQL, (name,)).fetchone() is not None
+
+
 def list_documents(conn: sqlite3.Connection, library_name: str) -> list:
     """List all documents for a library."""
     return conn.execute("""
@@ -214,52 +473,33 @@ def get_document(
     2. Else → exact match on path
     3. Else → exact match on title (case-insensitive)
     """
-    # Try by ID first if numeric
-    if identifier.isdigit():
-        row = conn.execute("""
-            SELECT d.id, d.path, d.title, d.url, d.content, l.name as library
-            FROM documents d
-            JOIN libraries l ON d.library_id = l.id
-            WHERE d.id = ? AND l.name = ?
-        """, (int(identifier), library_name)).fetchone()
-        if row:
-            return dict(row)
-
-    # Try exact path match
-    row = conn.execute("""
-        SELECT d.id, d.path, d.title, d.url, d.content, l.name as library
-        FROM documents d
-        JOIN libraries l ON d.library_id = l.id
-        WHERE d.path = ? AND l.name = ?
-    """, (identifier, library_name)).fetchone()
-    if row:
-        return dict(row)
-
-    # Try exact title match (case-insensitive)
-    row = conn.execute("""
-        SELECT d.id, d.path, d.title, d.url, d.content, l.name as library
-        FROM documents d
-        JOIN libraries l ON d.library_id = l.id
-        WHERE LOWER(d.title) = LOWER(?) AND l.name = ?
-    """, (identifier, library_name)).fetchone()
-    if row:
-        return dict(row)
+    library = conn.execute(_SELECT_LIBRARY_ID_SQL, (library_name,)).fetchone()
+    if not library:
+        return None
+
+    row = conn.execute(_GET_DOCUMENT_SQL, {
+        "library_id": library["id"],
+        "maybe_id": int(identifier) if identifier.isdigit() else -1,
+        "ident": identifier,
+    }).fetchone()
+    if not row:
+        return None
 
-    return None
+    doc = dict(row)
+    doc["library"] = library_name
+    return doc
 
 
 def delete_library(conn: sqlite3.Connection, name: str) -> bool:
     """Delete a library and all its documents."""
-    row = conn.execute(
-        "SELECT id FROM libraries WHERE name = ?",
-        (name,)
-    ).fetchone()
+    row = conn.execute(_SELECT_LIBRARY_ID_SQL, (name,)).fetchone()
 
     if not row:
         return False
 
     library_id = row["id"]
     conn.execute("DELETE FROM documents WHERE library_id = ?", (library_id,))
+    conn.execute("DELETE FROM files WHERE library_id = ?", (library_id,))
     conn.execute("DELETE FROM libraries WHERE id = ?", (library_id,))
     conn.commit()
     return True
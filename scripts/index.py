@@ -7,34 +7,118 @@ Usage:
 
 Batch mode:
     find docs -name "*.md" | python3 index.py <library> --batch --base-url "https://example.com/docs"
+
+Server mode (one JSON record per line: {"path": ..., "content": ..., "title": ..., "url": ...}):
+    producer | python3 index.py <library> --server
 """
 from __future__ import annotations
 import argparse
+import json
+import os
+import sqlite3
 import sys
 import re
-from db import get_connection, get_or_create_library, upsert_document
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from db import (
+    drop_fts_triggers,
+    get_connection,
+    get_file_stats,
+    get_or_create_library,
+    optimize_db,
+    rebuild_fts_index,
+    record_file_stats,
+    update_library_stats,
+    upsert_document,
+    upsert_documents_many,
+)
 
 # Chunk files larger than this (in characters)
 CHUNK_THRESHOLD = 8000
 
+# Titles (h1, frontmatter or rst heading) are only looked for in this many leading characters
+TITLE_SCAN_LIMIT = 4096
+
+# Extensions whose content is reStructuredText (Django and MongoDB docs use .txt)
+RST_EXTENSIONS = ('.rst', '.txt')
+
+# Upsert and commit batch inserts every N documents
+BATCH_COMMIT_SIZE = 1000
+
+# Threads reading and chunking files ahead of the single DB writer
+READ_WORKERS = 8
+
+# Max files read ahead of the writer
+READ_AHEAD = 64
+
+# h1 heading (group 1) or frontmatter title (group 2) in a single scan
+_TITLE_RE = re.compile(r'^(?:#\s+(.+)|title:\s*["\']?(.+?)["\']?\s*)$', re.MULTILINE)
+# rst section title: a text line underlined with a repeated punctuation character;
+# the title line itself must not be a run of one punctuation character
+_RST_TITLE_RE = re.compile(
+    r'^(?!(?P<rule>[=\-~^*#+`:\'"_.])(?P=rule)*[ \t]*$)(?P<title>\S.*)\n'
+    r'(?P<char>[=\-~^*#+`:\'"_.])(?P=char){2,}[ \t]*$',
+    re.MULTILINE,
+)
+_EXT_RE = re.compile(r'\.(md|mdx|rst)$')
+_INDEX_RE = re.compile(r'/index$')
+_ANCHOR_CLEAN_RE = re.compile(r'[^a-z0-9\s-]')
+_ANCHOR_WS_RE = re.compile(r'\s+')
+
 
 def extract_title(content: str, path: str) -> str:
-    """Extract title from markdown content or path."""
-    # Try to find first h1 heading
-    match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
-    if match:
-        return match.group(1).strip()
-
-    # Try frontmatter title
-    if content.startswith('---'):
-        fm_match = re.search(r'^title:\s*["\']?(.+?)["\']?\s*$', content, re.MULTILINE)
-        if fm_match:
-            return fm_match.group(1).strip()
+    """Extract title from markdown/rst content or path."""
+    head = content[:TITLE_SCAN_LIMIT]
+
+    if path.endswith(RST_EXTENSIONS):
+        # Skip frontmatter so its lines aren't read as underlined titles
+        frontmatter = ''
+        if head.startswith('---\n'):
+            fm_end = head.find('\n---', 3)
+            if fm_end != -1:
+                frontmatter, head = head[:fm_end], head[fm_end + 4:]
+
+        # Try first underlined section title, then the frontmatter title
+        match = _RST_TITLE_RE.search(head)
+        if match:
+            return match.group('title').strip()
+        for match in _TITLE_RE.finditer(frontmatter):
+            if match.group(2):
+                return match.group(2).strip()
+    else:
+        # First h1 heading wins, frontmatter title is the fallback
+        has_frontmatter = head.startswith('---')
+        fm_title = None
+        for match in _TITLE_RE.finditer(head):
+            if match.group(1):
+                return match.group(1).strip()
+            if has_frontmatter and fm_title is None:
+                fm_title = match.group(2).strip()
+        if fm_title:
+            return fm_title
 
     # Fall back to filename
     return path.split('/')[-1].replace('.md', '').replace('.mdx', '').replace('.rst', '').replace('-', ' ').title()
 
 
+def _chunk_by_h2(doc_content: str):
+    """Yield (heading, body) pairs for each ## section in one pass.
+
+    The first pair is the intro before any ## heading, with heading None.
+    """
+    heading = None
+    lines = []
+    for line in doc_content.split('\n'):
+        if line.startswith('## ') and len(line) > 3:
+            yield heading, '\n'.join(lines)
+            heading = line
+            lines = []
+        else:
+            lines.append(line)
+    yield heading, '\n'.join(lines)
+
+
 def chunk_document(content: str, path: str, base_url: str = None) -> list[dict]:
     """Split large documents into chunks by ## headings.
 
@@ -53,58 +137,57 @@ def chunk_document(content: str, path: str, base_url: str = None) -> list[dict]:
     # Extract frontmatter if present
     frontmatter = ''
     doc_content = content
-    if content.startswith('---'):
-        fm_end = content.find('---', 3)
+    if content.startswith('---\n'):
+        fm_end = content.find('\n---', 3)
         if fm_end != -1:
-            frontmatter = content[:fm_end + 3]
-            doc_content = content[fm_end + 3:].strip()
-
-    # Split by ## headings (keep the heading with its content)
-    sections = re.split(r'^(## .+)$', doc_content, flags=re.MULTILINE)
+            # Sections are stripped individually, so only the leading gap matters
+            frontmatter = content[:fm_end + 4]
+            doc_content = content[fm_end + 4:].lstrip()
 
     chunks = []
     doc_title = extract_title(content, path)
 
-    # First section (before any ##) - intro/overview
-    if sections[0].strip():
-        intro = sections[0].strip()
-        if frontmatter:
-            intro = frontmatter + '\n\n' + intro
+    # Split by ## headings (keep the heading with its content)
+    for heading, body in _chunk_by_h2(doc_content):
+        # First section (before any ##) - intro/overview
+        if heading is None:
+            intro = body.strip()
+            if intro:
+                if frontmatter:
+                    intro = frontmatter + '\n\n' + intro
+                chunks.append({
+                    'path': path,
+                    'content': intro,
+                    'title': doc_title,
+                    'url': base_url
+                })
+            continue
+
+        heading = heading.strip()
+        section_content = body.strip()
+
+        # Skip empty sections
+        if not section_content:
+            continue
+
+        # Extract section title from heading
+        section_title = heading.replace('## ', '').strip()
+        full_title = f"{doc_title} > {section_title}"
+
+        # Build section URL with anchor
+        section_url = base_url
+        if base_url:
+            anchor = _ANCHOR_CLEAN_RE.sub('', section_title.lower())
+            anchor = _ANCHOR_WS_RE.sub('-', anchor)
+            section_url = f"{base_url}#{anchor}"
+
         chunks.append({
-            'path': path,
-            'content': intro,
-            'title': doc_title,
-            'url': base_url
+            'path': f"{path}##{section_title}",
+            'content': f"{heading}\n\n{section_content}",
+            'title': full_title,
+            'url': section_url
         })
 
-    # Process heading + content pairs
-    for i in range(1, len(sections), 2):
-        if i + 1 < len(sections):
-            heading = sections[i].strip()
-            section_content = sections[i + 1].strip()
-
-            # Skip empty sections
-            if not section_content:
-                continue
-
-            # Extract section title from heading
-            section_title = heading.replace('## ', '').strip()
-            full_title = f"{doc_title} > {section_title}"
-
-            # Build section URL with anchor
-            section_url = base_url
-            if base_url:
-                anchor = re.sub(r'[^a-z0-9\s-]', '', section_title.lower())
-                anchor = re.sub(r'\s+', '-', anchor)
-                section_url = f"{base_url}#{anchor}"
-
-            chunks.append({
-                'path': f"{path}##{section_title}",
-                'content': f"{heading}\n\n{section_content}",
-                'title': full_title,
-                'url': section_url
-            })
-
     # If no chunks created (no ## headings), return whole document
     if not chunks:
         return [{
@@ -117,59 +200,235 @@ def chunk_document(content: str, path: str, base_url: str = None) -> list[dict]:
     return chunks
 
 
-def batch_index(library: str, base_url: str, strip_prefix: str = '', chunk: bool = True):
-    """Index multiple files from stdin."""
-    files = [line.strip() for line in sys.stdin if line.strip()]
-    total = len(files)
+def prepare_file(filepath: str, base_url: str, strip_prefix: str = '', chunk: bool = True) -> list[dict]:
+    """Read a file and build the documents to index for it.
+
+    Returns an empty list for empty files.
+    """
+    with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
+        content = f.read()
+
+    if not content or content.isspace():
+        return []
+
+    # Build URL from filepath
+    url_path = filepath
+    if strip_prefix and url_path.startswith(strip_prefix):
+        url_path = url_path[len(strip_prefix):]
+    url_path = url_path.lstrip('/')
+    # Remove extension and /index suffix
+    url_path = _EXT_RE.sub('', url_path)
+    url_path = _INDEX_RE.sub('/', url_path)
+    url = f"{base_url.rstrip('/')}/{url_path}" if base_url else None
+
+    # Chunk large documents or index as single doc
+    if chunk:
+        return chunk_document(content, filepath, url)
+    return [{
+        'path': filepath,
+        'content': content,
+        'title': extract_title(content, filepath),
+        'url': url
+    }]
+
+
+def read_paths(stream):
+    """Yield non-empty, stripped lines from a stream as they arrive."""
+    for line in stream:
+        path = line.strip()
+        if path:
+            yield path
+
+
+def _map_ahead(executor: ThreadPoolExecutor, fn, items, depth: int):
+    """Like executor.map, but consumes items lazily.
+
+    At most `depth` calls are in flight; results are yielded in input order.
+    """
+    in_flight = deque()
+    for item in items:
+        in_flight.append(executor.submit(fn, item))
+        if len(in_flight) >= depth:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
 
-    if total == 0:
+def flush_documents(conn: sqlite3.Connection, rows: list) -> set:
+    """Upsert a batch of document rows, skipping rows that fail.
+
+    The batch runs under a savepoint; if it fails it is rolled back and
+    retried row by row so one bad document does not drop the others.
+    Returns the paths of the rows that were skipped.
+    """
+    failed = set()
+    conn.execute("SAVEPOINT flush")
+    try:
+        upsert_documents_many(conn, rows)
+    except (sqlite3.Error, UnicodeError):
+        conn.execute("ROLLBACK TO flush")
+        for row in rows:
+            try:
+                upsert_documents_many(conn, (row,))
+            except (sqlite3.Error, UnicodeError):
+                failed.add(row[1])  # Silent errors
+    conn.execute("RELEASE flush")
+    return failed
+
+
+def _flush_batch(conn: sqlite3.Connection, rows: list, files: list) -> None:
+    """Upsert document rows, then record stats for files fully indexed.
+
+    files holds (file stats row, document paths) pairs; a file with any
+    skipped document keeps its old stats so the next run retries it.
+    """
+    failed = flush_documents(conn, rows) if rows else set()
+    record_file_stats(conn, [
+        file_row for file_row, doc_paths in files
+        if failed.isdisjoint(doc_paths)
+    ])
+
+
+def batch_index(
+    library: str,
+    base_url: str,
+    strip_prefix: str = '',
+    chunk: bool = True,
+    rebuild_fts: bool = False,
+    force: bool = False
+):
+    """Index multiple files from stdin.
+
+    Paths are consumed as they arrive; files are read and chunked on a
+    thread pool while a single writer upserts the results in order.
+
+    With rebuild_fts, the FTS triggers are dropped and the whole load runs
+    in one transaction, followed by a single full-text index rebuild. This
+    is faster for cold (re)indexing, but the rebuild covers every library.
+
+    Files whose mtime and size (and indexing options) match the previous
+    run are skipped without being read, unless force is set.
+    """
+    files = read_paths(sys.stdin)
+    first = next(files, None)
+
+    if first is None:
         return
+    files = chain((first,), files)
 
     conn = get_connection()
     library_id = get_or_create_library(conn, library)
+    known = {} if force else get_file_stats(conn, library_id)
+    options = json.dumps([base_url, strip_prefix, chunk])
+    pending = []
+    pending_files = []
 
-    for filepath in files:
+    def prepare(filepath: str) -> tuple:
+        """Return (file stats row, documents); the row is None if skipped."""
         try:
-            with open(filepath, 'r', encoding='utf-8', errors='replace') as f:
-                content = f.read()
-
-            if not content.strip():
-                continue
+            st = os.stat(filepath)
+            stats = (st.st_mtime_ns, st.st_size, options)
+            if known.get(filepath) == stats:
+                return None, []  # Unchanged since last run
+            docs = prepare_file(filepath, base_url, strip_prefix, chunk)
+            return (library_id, filepath) + stats, docs
+        except Exception:
+            return None, []  # Silent errors
 
-            # Build URL from filepath
-            url_path = filepath
-            if strip_prefix and url_path.startswith(strip_prefix):
-                url_path = url_path[len(strip_prefix):]
-            url_path = url_path.lstrip('/')
-            # Remove extension and /index suffix
-            url_path = re.sub(r'\.(md|mdx|rst)$', '', url_path)
-            url_path = re.sub(r'/index$', '/', url_path)
-            url = f"{base_url.rstrip('/')}/{url_path}" if base_url else None
-
-            # Chunk large documents or index as single doc
-            if chunk:
-                chunks = chunk_document(content, filepath, url)
-            else:
-                chunks = [{
-                    'path': filepath,
-                    'content': content,
-                    'title': extract_title(content, filepath),
-                    'url': url
-                }]
+    # Manage the transaction explicitly rather than via implicit BEGINs
+    conn.isolation_level = None
+    conn.execute("BEGIN")
+    if rebuild_fts:
+        drop_fts_triggers(conn)
 
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        for file_row, chunks in _map_ahead(executor, prepare, files, READ_AHEAD):
+            if file_row is None:
+                continue
             for doc in chunks:
-                upsert_document(
-                    conn,
-                    library_id=library_id,
-                    path=doc['path'],
-                    content=doc['content'],
-                    title=doc['title'],
-                    url=doc['url']
+                pending.append(
+                    (library_id, doc['path'], doc['content'], doc['title'], doc['url'])
                 )
+            pending_files.append((file_row, [doc['path'] for doc in chunks]))
+            if len(pending) >= BATCH_COMMIT_SIZE:
+                _flush_batch(conn, pending, pending_files)
+                # Keep a rebuild in one transaction so triggers are never left dropped
+                if not rebuild_fts:
+                    conn.commit()
+                    conn.execute("BEGIN")
+                pending = []
+                pending_files = []
+
+    if pending_files:
+        _flush_batch(conn, pending, pending_files)
+    if rebuild_fts:
+        rebuild_fts_index(conn)
+    update_library_stats(conn, library_id)
+    conn.commit()
+    optimize_db(conn)
+    conn.close()
 
-        except Exception:
-            pass  # Silent errors
 
+def read_records(stream):
+    """Yield (path, content, title, url) for each valid NDJSON record.
+
+    Records with missing or mistyped fields, or empty content, are skipped.
+    """
+    for line in stream:
+        if not line or line.isspace():
+            continue
+        try:
+            record = json.loads(line)
+            path = record['path']
+            content = record['content']
+            title = record.get('title')
+            url = record.get('url')
+            if not isinstance(path, str) or not isinstance(content, str):
+                continue
+            if not isinstance(title, (str, type(None))) or not isinstance(url, (str, type(None))):
+                continue
+        except (ValueError, KeyError, TypeError):
+            continue  # Silent errors
+
+        if not content or content.isspace():
+            continue
+        yield path, content, title, url
+
+
+def stream_index(library: str):
+    """Index newline-delimited JSON records from stdin over one connection.
+
+    Each record needs "path" and "content"; "title" is auto-extracted when
+    missing and "url" is optional. Invalid or empty records are skipped,
+    as are records SQLite cannot store (e.g. lone surrogates).
+    """
+    records = read_records(sys.stdin)
+    first = next(records, None)
+
+    if first is None:
+        return
+    records = chain((first,), records)
+
+    conn = get_connection()
+    library_id = get_or_create_library(conn, library)
+    pending = []
+
+    conn.isolation_level = None
+    conn.execute("BEGIN")
+    for path, content, title, url in records:
+        title = title or extract_title(content, path)
+        pending.append((library_id, path, content, title, url))
+        if len(pending) >= BATCH_COMMIT_SIZE:
+            flush_documents(conn, pending)
+            conn.commit()
+            conn.execute("BEGIN")
+            pending = []
+
+    if pending:
+        flush_documents(conn, pending)
+    update_library_stats(conn, library_id)
+    conn.commit()
+    optimize_db(conn)
     conn.close()
 
 
@@ -181,15 +440,30 @@ def main():
     parser.add_argument('--title', '-t', help='Document title (auto-extracted if not provided)')
     parser.add_argument('--content', '-c', help='Content (reads from stdin if not provided)')
     parser.add_argument('--batch', '-b', action='store_true', help='Batch mode: read file paths from stdin')
+    parser.add_argument('--server', action='store_true', help='Server mode: read JSON document records from stdin')
     parser.add_argument('--base-url', help='Base URL for batch mode (e.g., https://docs.example.com)')
     parser.add_argument('--strip-prefix', default='', help='Prefix to strip from paths for URL generation')
+    parser.add_argument('--rebuild-fts', action='store_true', help='Batch mode: bulk load, then rebuild the full-text index in one pass')
+    parser.add_argument('--force', action='store_true', help='Batch mode: re-index files even if unchanged since the last run')
     parser.add_argument('--no-chunk', action='store_true', help='Disable automatic chunking of large documents')
 
     args = parser.parse_args()
 
     # Batch mode
     if args.batch:
-        batch_index(args.library, args.base_url or '', args.strip_prefix, chunk=not args.no_chunk)
+        batch_index(
+            args.library,
+            args.base_url or '',
+            args.strip_prefix,
+            chunk=not args.no_chunk,
+            rebuild_fts=args.rebuild_fts,
+            force=args.force
+        )
+        return
+
+    # Server mode
+    if args.server:
+        stream_index(args.library)
         return
 
     # Single file mode
@@ -202,7 +476,7 @@ def main():
     else:
         content = sys.stdin.read()
 
-    if not content.strip():
+    if not content or content.isspace():
         print("Error: No content provided", file=sys.stderr)
         sys.exit(1)
 
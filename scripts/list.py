@@ -8,7 +8,9 @@ Usage:
 """
 import argparse
 import json
-from db import get_connection, list_libraries, list_documents, delete_library
+from client import open_client
+from db import get_connection, delete_library
+from output import dumps
 
 
 def main():
@@ -19,9 +21,8 @@ def main():
 
     args = parser.parse_args()
 
-    conn = get_connection()
-
     if args.delete:
+        conn = get_connection()
         if delete_library(conn, args.delete):
             print(f"Deleted library: {args.delete}")
         else:
@@ -31,8 +32,8 @@ def main():
 
     # List documents for a specific library
     if args.library:
-        docs = list_documents(conn, args.library)
-        conn.close()
+        with open_client() as call:
+            docs = call('list_documents', args.library)
 
         if not docs:
             if args.json:
@@ -50,7 +51,7 @@ def main():
                 ],
                 "count": len(docs)
             }
-            print(json.dumps(output, indent=2))
+            print(dumps(output))
         else:
             print(f"Documents in '{args.library}' ({len(docs)} docs):\n")
             for i, row in enumerate(docs, 1):
@@ -61,8 +62,8 @@ def main():
         return
 
     # List all libraries
-    libraries = list_libraries(conn)
-    conn.close()
+    with open_client() as call:
+        libraries = call('list_libraries')
 
     if not libraries:
         if args.json:
@@ -83,7 +84,7 @@ def main():
             ],
             "count": len(libraries)
         }
-        print(json.dumps(output, indent=2))
+        print(dumps(output))
     else:
         print("Indexed libraries:\n")
         for row in libraries:
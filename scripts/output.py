@@ -0,0 +1,15 @@
+"""JSON output for the command-line scripts."""
+import json
+
+
+def dumps(obj) -> str:
+    """Serialize CLI output as indented JSON, using orjson when available.
+
+    orjson is imported here rather than at module level so plain-text
+    output doesn't pay for loading it.
+    """
+    try:
+        import orjson
+    except ImportError:
+        return json.dumps(obj, indent=2)
+    return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
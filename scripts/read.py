@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 """Read full document content from indexed library documentation."""
 import argparse
-import json
 import sys
 
-from db import get_connection, get_document
+from client import open_client
+from output import dumps
 
 
 def parse_lines(lines_arg: str) -> tuple[int, int]:
@@ -21,6 +21,25 @@ def parse_lines(lines_arg: str) -> tuple[int, int]:
     return start, end
 
 
+def slice_lines(content: str, start: int, end: int) -> str:
+    """Return lines start..end (1-indexed, inclusive) of content.
+
+    Walks newlines with str.find instead of splitting the whole document.
+    """
+    pos = 0
+    for _ in range(start - 1):
+        pos = content.find('\n', pos) + 1
+        if pos == 0:
+            return ''
+
+    stop = pos
+    for _ in range(end - start + 1):
+        stop = content.find('\n', stop) + 1
+        if stop == 0:
+            return content[pos:]
+    return content[pos:stop - 1]
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Read full document content by ID, path, or title"
@@ -32,8 +51,8 @@ def main():
                         help="Output as JSON with metadata")
     args = parser.parse_args()
 
-    conn = get_connection()
-    doc = get_document(conn, args.library, args.identifier)
+    with open_client() as call:
+        doc = call('get_document', args.library, args.identifier)
 
     if not doc:
         print(f"Document not found: '{args.identifier}' in library '{args.library}'", file=sys.stderr)
@@ -46,9 +65,7 @@ def main():
     if args.lines:
         try:
             start, end = parse_lines(args.lines)
-            lines = content.split('\n')
-            # Convert to 0-indexed, slice, rejoin
-            content = '\n'.join(lines[start - 1:end])
+            content = slice_lines(content, start, end)
         except ValueError as e:
             print(f"Invalid --lines argument: {e}", file=sys.stderr)
             sys.exit(1)
@@ -64,7 +81,7 @@ def main():
         }
         if args.lines:
             output["lines"] = args.lines
-        print(json.dumps(output, indent=2))
+        print(dumps(output))
     else:
         # Human-readable output
         print(f"# {doc['title'] or doc['path']}")
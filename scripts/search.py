@@ -11,7 +11,8 @@ Examples:
 """
 import argparse
 import json
-from db import get_connection, search_documents, list_libraries
+from client import open_client
+from output import dumps
 
 
 def main():
@@ -23,12 +24,12 @@ def main():
 
     args = parser.parse_args()
 
-    conn = get_connection()
+    with open_client() as call:
+        results = call('search', args.query, args.library, args.limit)
 
-    # Validate library exists if specified
-    if args.library:
-        libraries = [row["name"] for row in list_libraries(conn)]
-        if args.library not in libraries:
+        # Any hit proves the library exists; only check on an empty result
+        if not results and args.library and not call('library_exists', args.library):
+            libraries = [row["name"] for row in call('list_libraries')]
             if args.json:
                 print(json.dumps({"error": f"Library '{args.library}' not found", "available": libraries}))
             else:
@@ -37,12 +38,8 @@ def main():
                     print(f"Available libraries: {', '.join(libraries)}")
                 else:
                     print("No libraries indexed yet.")
-            conn.close()
             return
 
-    results = search_documents(conn, args.query, args.library, args.limit)
-    conn.close()
-
     if not results:
         if args.json:
             print(json.dumps({"results": [], "count": 0, "query": args.query}))
@@ -65,7 +62,7 @@ def main():
             ],
             "count": len(results)
         }
-        print(json.dumps(output, indent=2))
+        print(dumps(output))
     else:
         lib_filter = f" in '{args.library}'" if args.library else ""
         print(f"Found {len(results)} result(s) for '{args.query}'{lib_filter}:\n")
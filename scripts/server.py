@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""Serve read-only queries over a UNIX socket from one open connection.
+
+Usage:
+    python3 server.py [--socket path]
+
+Clients:
+    export LIBRARY_DOCS_SOCKET=~/.cache/library-docs.sock
+    python3 search.py "<query>"    # list.py and read.py work the same way
+
+Protocol: one JSON request line per connection, {"cmd": ..., "args": [...]},
+answered with one JSON line, {"result": ...} or {"error": ...}.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sqlite3
+import sys
+from pathlib import Path
+from client import COMMANDS, SOCKET_ENV
+from db import get_connection
+
+DEFAULT_SOCKET = Path.home() / '.cache' / 'library-docs.sock'
+
+# Give up on a client that sends nothing for this long (seconds)
+CLIENT_TIMEOUT = 5.0
+
+
+def _to_json(result):
+    """Turn sqlite3.Row results into plain dicts."""
+    if isinstance(result, list):
+        return [dict(row) for row in result]
+    if isinstance(result, (sqlite3.Row, dict)):
+        return dict(result)
+    return result
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    timeout = CLIENT_TIMEOUT
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            fn = COMMANDS[request['cmd']]
+            response = {"result": _to_json(fn(self.server.conn, *request.get('args', ())))}
+        except Exception as e:
+            response = {"error": f"{type(e).__name__}: {e}"}
+        self.wfile.write(json.dumps(response).encode() + b'\n')
+
+
+class DocsServer(socketserver.UnixStreamServer):
+    """Answers requests one at a time over a single read connection."""
+
+    def __init__(self, path: str):
+        super().__init__(path, _Handler)
+        self.conn = get_connection(writer=False)
+
+    def server_close(self):
+        super().server_close()
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve documentation queries over a UNIX socket')
+    parser.add_argument('--socket', '-s', default=os.environ.get(SOCKET_ENV) or str(DEFAULT_SOCKET),
+                        help=f'Socket path (default: ${SOCKET_ENV} or {DEFAULT_SOCKET})')
+    args = parser.parse_args()
+
+    path = Path(args.socket).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()  # Stale socket from a previous run
+
+    server = DocsServer(str(path))
+    path.chmod(0o600)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Serving on {path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        path.unlink(missing_ok=True)
+
+
+if __name__ == '__main__':
+    main()